@@ -1,16 +1,24 @@
 import argparse
 import asyncio
+import json
 import logging
 import os
 import re
-from dataclasses import dataclass
+import signal
+import socket
+import sys
+import tempfile
+from dataclasses import asdict, dataclass
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from urllib.parse import quote_plus
 
 import aiohttp
+import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
+from aiohttp_client_cache import CachedSession, SQLiteBackend
+from selectolax.lexbor import LexborHTMLParser
+from xlsxwriter.exceptions import FileCreateError
 
 # Configure logging
 logging.basicConfig(
@@ -20,6 +28,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# --daemon mode needs Unix domain sockets and uid-based ownership checks
+DAEMON_SUPPORTED = hasattr(socket, 'AF_UNIX') and hasattr(os, 'getuid')
+
+def default_socket_path() -> str:
+    """Return the per-user path of the --daemon socket."""
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_dir:
+        runtime_dir = os.path.join(tempfile.gettempdir(), f'price_finder-{os.getuid()}')
+    return os.path.join(runtime_dir, 'price_finder.sock')
+
+def _owned_by_user(path: str, private: bool = False) -> bool:
+    """Check that path belongs to the current user and, if private, that no one else can access it."""
+    st = os.lstat(path)
+    if st.st_uid != os.getuid():
+        return False
+    return not (private and st.st_mode & 0o077)
+
 # Type definitions
 @dataclass
 class Product:
@@ -43,60 +68,157 @@ class EbayPriceScraper:
         'au': 'ebay.com.au'
     }
     
+    # Site labels shared by every product from the same region
+    _SITE_LABELS = {region: sys.intern(f"eBay ({region.upper()})") for region in EBAY_SITES}
+    
     # Single reliable user agent is sufficient for most cases
     USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     
-    def __init__(self, max_products: int = 5, regions: Optional[List[str]] = None):
+    _HEADERS = {
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+    }
+    
+    # Result page sizes eBay accepts for the _ipg parameter
+    PAGE_SIZES = (25, 50, 100, 200)
+    
+    # CSS selectors for the search results page
+    _SEL_RESULTS = 'ul.srp-results'
+    _SEL_CARD = 'div.s-item__wrapper'
+    _SEL_TITLE = 'div.s-item__title span'
+    _SEL_PRICE = '.s-item__price'
+    _SEL_LINK = 'a.s-item__link'
+    # Title, price and link matched together so each card is walked only once
+    _SEL_FIELDS = f'{_SEL_TITLE}, {_SEL_PRICE}, {_SEL_LINK}'
+    
+    # Cards and titles that are ads or placeholders rather than listings
+    _SKIP_CLASSES = frozenset({'srp-river-answer'})
+    _SKIP_NAME = 'shop on ebay'
+    
+    # Connection pool and timeout settings for the shared session
+    CONNECTOR_LIMIT = 32
+    CONNECTOR_LIMIT_PER_HOST = 8
+    DNS_CACHE_TTL = 300  # seconds
+    # Keep idle connections as long as DNS entries, so searches minutes apart skip the TLS handshake
+    KEEPALIVE_TIMEOUT = DNS_CACHE_TTL
+    TIMEOUT = aiohttp.ClientTimeout(total=20, connect=5)
+    
+    # On-disk cache of search result pages, keyed on the request URL (region + query)
+    CACHE_FILE = 'ebay_cache.sqlite'
+    CACHE_EXPIRE = 900  # seconds
+    
+    def __init__(self, max_products: int = 5, regions: Optional[List[str]] = None, use_cache: bool = True):
         """Initialize the scraper with configuration."""
         self.max_products = max_products
         self.regions = regions or ['us']
+        self.use_cache = use_cache
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._sessions: Dict[bool, aiohttp.ClientSession] = {}  # Keyed on use_cache
+    
+    async def __aenter__(self) -> 'EbayPriceScraper':
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session for the current cache setting, creating it on first use."""
+        # The connector must be created inside the running event loop, hence lazily
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(
+                limit=self.CONNECTOR_LIMIT,
+                limit_per_host=self.CONNECTOR_LIMIT_PER_HOST,
+                ttl_dns_cache=self.DNS_CACHE_TTL,
+                keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+                enable_cleanup_closed=True
+            )
+            self._sessions = {}
+        
+        session = self._sessions.get(self.use_cache)
+        if session is None or session.closed:
+            # Cached and uncached sessions share one pool, which the scraper owns
+            if self.use_cache:
+                cache = SQLiteBackend(self.CACHE_FILE, expire_after=self.CACHE_EXPIRE)
+                session = CachedSession(cache=cache, connector=self._connector,
+                                        connector_owner=False, timeout=self.TIMEOUT)
+            else:
+                session = aiohttp.ClientSession(connector=self._connector,
+                                                connector_owner=False, timeout=self.TIMEOUT)
+            self._sessions[self.use_cache] = session
+        return session
+    
+    async def close(self) -> None:
+        """Close the shared sessions and their pooled connections."""
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        self._sessions = {}
+        
+        if self._connector is not None and not self._connector.closed:
+            await self._connector.close()
+        self._connector = None
     
     def _get_headers(self) -> dict:
-        """Generate headers for requests."""
-        return {
-            'User-Agent': self.USER_AGENT,
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
+        """Return the headers for requests."""
+        # aiohttp copies headers into each request, so the shared dict is never mutated
+        return self._HEADERS
+    
+    def _extract_fields(self, card) -> tuple:
+        """Find the title, price and link elements of a card in a single pass."""
+        title_element = price_element = link_element = None
+        for node in card.css(self._SEL_FIELDS):
+            classes = (node.attributes.get('class') or '').split()
+            if 's-item__price' in classes:
+                if price_element is None:
+                    price_element = node
+            elif node.tag == 'a' and 's-item__link' in classes:
+                if link_element is None:
+                    link_element = node
+            elif node.tag == 'span' and title_element is None:
+                title_element = node
+        return title_element, price_element, link_element
     
-    async def _extract_product_data(self, card, region: str) -> Optional[Product]:
+    def _extract_product_data(self, card, region: str) -> Optional[Product]:
         """Extract product information from a card element."""
         try:
             # Skip sponsored or special items
-            if 'srp-river-answer' in card.get('class', []):
+            if not self._SKIP_CLASSES.isdisjoint((card.attributes.get('class') or '').split()):
                 return None
             
+            title_element, price_element, link_element = self._extract_fields(card)
+            
             # Extract title
-            title_element = card.select_one('div.s-item__title span')
-            if not title_element or 'New Listing' in title_element.text:
+            if title_element is None or 'New Listing' in title_element.text():
                 return None
                 
-            name = title_element.text.strip()
+            name = title_element.text().strip()
+            if len(name) <= 5:  # Skip very short names
+                return None
             # Skip "Shop on eBay" ads
-            if name == "Shop on eBay" or "shop on ebay" in name.lower():
+            name_cf = name.casefold()
+            if self._SKIP_NAME in name_cf:
                 return None
             
             # Extract price
-            price_element = card.select_one('.s-item__price')
-            if not price_element or 'to' in price_element.text.lower():  # Skip price ranges
+            if price_element is None or 'to' in price_element.text().lower():  # Skip price ranges
                 return None
-            price = price_element.text.strip()
+            price = price_element.text().strip()
             
             # Extract URL
-            link_element = card.select_one('a.s-item__link')
-            if not link_element or not link_element.get('href'):
+            if link_element is None or not link_element.attributes.get('href'):
                 return None
-            url = link_element['href']  # Keep original URL intact
+            url = link_element.attributes['href']  # Keep original URL intact
             
             # Return product if all information is valid
-            if name and price and url and len(name) > 5:  # Skip very short names
+            if price and url:
                 return Product(
                     name=name,
                     price=price,
                     url=url,
-                    site=f"eBay ({region.upper()})"
+                    site=self._SITE_LABELS.get(region) or f"eBay ({region.upper()})"
                 )
             return None
             
@@ -104,35 +226,65 @@ class EbayPriceScraper:
             # Less verbose error handling
             return None
     
+    def _page_size(self) -> int:
+        """Pick the smallest results page that leaves room for skipped cards."""
+        wanted = self.max_products * 2  # Ads and placeholder cards get filtered out
+        for size in self.PAGE_SIZES:
+            if size >= wanted:
+                return size
+        return self.PAGE_SIZES[-1]
+    
+    def _iter_cards(self, tree):
+        """Yield listing cards in page order, stopping as soon as the caller does."""
+        # Only the results list holds listing cards; skip nav, footer and recommendations
+        results = tree.css_first(self._SEL_RESULTS)
+        if results is None:
+            yield from tree.css(self._SEL_CARD)
+            return
+        
+        for item in results.iter():
+            card = item.css_first(self._SEL_CARD)
+            if card is not None:
+                yield card
+    
+    def _parse_products(self, html: bytes, region: str) -> List[Product]:
+        """Parse a search results page into products."""
+        if self.max_products <= 0:
+            return []
+        
+        tree = LexborHTMLParser(html)
+        
+        # Skip cards that are not valid listings and stop once enough are found
+        found_cards = False
+        valid_products = []
+        for card in self._iter_cards(tree):
+            found_cards = True
+            product = self._extract_product_data(card, region)
+            if product is not None:
+                valid_products.append(product)
+                if len(valid_products) == self.max_products:
+                    break
+        
+        if not found_cards:
+            logger.warning(f"No product cards found on eBay {region}.")
+            return []
+        
+        logger.info(f"Extracted {len(valid_products)} products from eBay {region}")
+        return valid_products
+    
     async def _search_region(self, session: aiohttp.ClientSession, query: str, region: str) -> List[Product]:
         """Search for products in a specific eBay region."""
         try:
             ebay_domain = self.EBAY_SITES.get(region, 'ebay.com')
-            url = f"https://www.{ebay_domain}/sch/i.html?_nkw={quote_plus(query)}&_ipg=100"  # Show 100 items per page
+            url = f"https://www.{ebay_domain}/sch/i.html?_nkw={quote_plus(query)}&_ipg={self._page_size()}"
             
             async with session.get(url, headers=self._get_headers()) as response:
                 response.raise_for_status()
-                html = await response.text()
-                
-                soup = BeautifulSoup(html, 'html.parser')
-                product_cards = soup.select('div.s-item__wrapper')
-                
-                if not product_cards:
-                    logger.warning(f"No product cards found on eBay {region}.")
-                    return []
-                
-                # Process cards concurrently
-                tasks = [
-                    self._extract_product_data(card, region)
-                    for card in product_cards[:self.max_products]
-                ]
-                products = await asyncio.gather(*tasks)
-                
-                # Filter out None values
-                valid_products = [p for p in products if p is not None]
-                
-                logger.info(f"Extracted {len(valid_products)} products from eBay {region}")
-                return valid_products
+                html = await response.read()  # Lexbor decodes the raw bytes in C
+            
+            # Parse off the event loop so other regions keep downloading meanwhile
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._parse_products, html, region)
                 
         except Exception as e:
             logger.error(f"Error searching eBay {region}: {e}")
@@ -142,17 +294,18 @@ class EbayPriceScraper:
         """Search for products on multiple eBay sites concurrently."""
         logger.info(f"Searching for '{query}' on {len(self.regions)} eBay sites...")
         
-        async with aiohttp.ClientSession() as session:
-            tasks = [
-                self._search_region(session, query, region)
-                for region in self.regions
-            ]
-            results = await asyncio.gather(*tasks)
-            
-            # Flatten results
-            all_products = [p for products in results for p in products]
-            
-            return all_products
+        # Reuse pooled keep-alive connections and cached DNS across searches
+        session = self._get_session()
+        tasks = [
+            self._search_region(session, query, region)
+            for region in self.regions
+        ]
+        results = await asyncio.gather(*tasks)
+        
+        # Flatten results
+        all_products = [p for products in results for p in products]
+        
+        return all_products
 
 class ExcelExporter:
     """Handles exporting data to Excel files."""
@@ -162,15 +315,13 @@ class ExcelExporter:
         if not products:
             raise ValueError("No products to export")
         
-        # Prepare data for Excel
-        data = [{
-            'Product Name': p.name,
-            'Price': p.price,
-            'Site': p.site,
-            'Link': ''  # Will be filled with formulas later
-        } for p in products]
-        
-        df = pd.DataFrame(data)
+        # Prepare data for Excel, one list per column so pandas skips the row transposition
+        df = pd.DataFrame.from_dict({
+            'Product Name': [p.name for p in products],
+            'Price': [p.price for p in products],
+            'Site': [p.site for p in products],
+            'Link': ['View Product'] * len(products)  # Link text; replaced with hyperlinks below
+        })
         
         # Generate output filename if none provided
         if not output_file:
@@ -181,32 +332,24 @@ class ExcelExporter:
         
         try:
             # Save to Excel with multiple sheets
-            with pd.ExcelWriter(output_file, engine='openpyxl', mode='w') as writer:
+            with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
                 # First write the DataFrame
                 df.to_excel(writer, sheet_name='Products', index=False)
                 
                 # Get worksheet
                 worksheet = writer.sheets['Products']
                 
-                # Add formulas for links
-                for idx, product in enumerate(products, start=2):  # Excel rows start at 1, header is row 1
-                    cell = worksheet.cell(row=idx, column=4)  # Column D is the Link column
-                    cell.value = f'=HYPERLINK("{product.url}","View Product")'
+                # Add links
+                for idx, product in enumerate(products, start=1):  # Row 0 is the header
+                    worksheet.write_url(idx, 3, product.url, string='View Product')  # Column D is the Link column
                 
-                # Adjust column widths
-                for column in worksheet.columns:
-                    max_length = 0
-                    column = list(column)
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = (max_length + 2)
-                    worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
+                # Adjust column widths to the longer of the header and the longest value
+                lengths = df.astype(str).apply(lambda col: col.str.len())
+                widths = np.maximum(lengths.max().to_numpy(), [len(col) for col in df.columns]) + 2
+                for i, width in enumerate(widths):
+                    worksheet.set_column(i, i, int(width))
         
-        except PermissionError:
+        except (PermissionError, FileCreateError):
             # If file is locked, save with a new name
             base, ext = os.path.splitext(output_file)
             output_file = f"{base}_new{ext}"
@@ -216,28 +359,162 @@ class ExcelExporter:
         logger.info(f"Successfully saved {len(products)} products to {output_file}")
         return output_file
 
+class SearchDaemon:
+    """Serves searches over a Unix socket from a scraper with a warm session."""
+    
+    def __init__(self, scraper: EbayPriceScraper, socket_path: Optional[str] = None):
+        """Initialize the daemon with the scraper whose session it keeps open."""
+        self.scraper = scraper
+        self.socket_path = socket_path or default_socket_path()
+        # Requests reconfigure the shared scraper, so they are served one at a time
+        self._lock = asyncio.Lock()
+    
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Run one JSON-encoded search request and reply with the products."""
+        try:
+            data = await reader.read()
+            if not data:  # Liveness probe from another daemon starting up
+                return
+            request = json.loads(data)
+            async with self._lock:
+                self.scraper.max_products = request['max_products']
+                self.scraper.regions = request['regions']
+                self.scraper.use_cache = request.get('use_cache', True)
+                products = await self.scraper.search(request['query'])
+            
+            writer.write(json.dumps([asdict(p) for p in products]).encode())
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"Error handling daemon request: {e}")
+        finally:
+            writer.close()
+    
+    async def serve(self) -> None:
+        """Listen for search requests until interrupted."""
+        # Other local users must not be able to replace or connect to the socket
+        socket_dir = os.path.dirname(self.socket_path)
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+        if not _owned_by_user(socket_dir, private=True):
+            raise RuntimeError(f"{socket_dir} must be owned by and private to the current user")
+        
+        if os.path.exists(self.socket_path):
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.connect(self.socket_path)
+            except ConnectionRefusedError:
+                # Left behind by a daemon that did not shut down cleanly
+                os.unlink(self.socket_path)
+            else:
+                raise RuntimeError(f"A daemon is already running on {self.socket_path}")
+        
+        server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        logger.info(f"Daemon listening on {self.socket_path} (press Ctrl+C to stop)")
+        
+        # Stop on Ctrl+C or SIGTERM instead of unwinding with a KeyboardInterrupt
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+def query_daemon(query: str, max_products: int, regions: List[str], use_cache: bool = True,
+                 socket_path: Optional[str] = None) -> Optional[List[Product]]:
+    """Search through a running daemon, returning None if none is reachable."""
+    if not DAEMON_SUPPORTED:
+        return None
+    socket_path = socket_path or default_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    
+    request = json.dumps({
+        'query': query,
+        'max_products': max_products,
+        'regions': regions,
+        'use_cache': use_cache
+    })
+    try:
+        # Only trust a daemon started by the current user, since its URLs end up in the workbook.
+        # Checked inside the try so a daemon exiting meanwhile falls back like any other miss.
+        if not (_owned_by_user(os.path.dirname(socket_path), private=True) and _owned_by_user(socket_path)):
+            logger.warning(f"Ignoring daemon socket not owned by the current user: {socket_path}")
+            return None
+        
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(60)
+            sock.connect(socket_path)
+            sock.sendall(request.encode())
+            sock.shutdown(socket.SHUT_WR)  # Signals the end of the request
+            
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        
+        return [Product(**item) for item in json.loads(b''.join(chunks))]
+    except (OSError, ValueError, TypeError) as e:
+        logger.debug(f"Daemon unavailable, searching directly: {e}")
+        return None
+
+def _positive_int(value: str) -> int:
+    """Argparse type for options that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
 async def main():
     """Main function to run the price comparison tool."""
     parser = argparse.ArgumentParser(
         description="Compare product prices from multiple eBay sites.",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
-    parser.add_argument('query', help='Product name to search for')
+    parser.add_argument('query', nargs='?', help='Product name to search for')
     parser.add_argument('--output', '-o', help='Output Excel file name')
-    parser.add_argument('--max-products', '-m', type=int, default=5,
+    parser.add_argument('--max-products', '-m', type=_positive_int, default=5,
                        help='Maximum number of products to fetch per region')
     parser.add_argument('--regions', '-r', nargs='+', choices=EbayPriceScraper.EBAY_SITES.keys(),
                        default=['us'], help='eBay regions to search')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Always fetch fresh results instead of using the local page cache')
+    parser.add_argument('--daemon', action='store_true',
+                       help='Keep a warm connection pool running and serve searches from later runs')
     
     args = parser.parse_args()
+    if args.daemon and not DAEMON_SUPPORTED:
+        parser.error('--daemon is only supported on Unix-like systems')
+    if not args.daemon and not args.query:
+        parser.error('the query argument is required unless --daemon is given')
     
     try:
-        # Initialize scraper and exporter
-        scraper = EbayPriceScraper(max_products=args.max_products, regions=args.regions)
+        if args.daemon:
+            try:
+                # Each request carries its own cache setting
+                async with EbayPriceScraper() as scraper:
+                    await SearchDaemon(scraper).serve()
+            except (KeyboardInterrupt, asyncio.CancelledError):
+                pass
+            logger.info("Daemon stopped")
+            return 0
+        
+        # Initialize exporter
         exporter = ExcelExporter()
         
-        # Search for products
-        products = await scraper.search(args.query)
+        # Search for products, through the daemon if one is running
+        products = query_daemon(args.query, args.max_products, args.regions,
+                                use_cache=not args.no_cache)
+        if products is None:
+            async with EbayPriceScraper(max_products=args.max_products, regions=args.regions,
+                                        use_cache=not args.no_cache) as scraper:
+                products = await scraper.search(args.query)
         
         if not products:
             logger.warning("No products found. Try a different search term.")